@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Ear-clipping tesselation of simple polygons, compiled with Numba.
+
+Used by `ShapeStim` in place of the GLU tesselator (`tesselate.py`) for the
+common case of a single, non-self-intersecting loop of vertices. Only used if
+Numba is installed, check `haveNumba` before calling `earclip()`. Importing
+this module imports Numba, so it's only imported (and `earclip()` compiled)
+by `psychopy.visual.shape.loadNumbaHelpers()`, when the first shape which
+isn't convex is made.
+"""
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2024 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+__all__ = ['haveNumba', 'earclip']
+
+import numpy
+
+try:
+    from numba import njit
+    haveNumba = True
+except ImportError:
+    haveNumba = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for `numba.njit` so the functions below can still be
+        defined (and called, slowly) without Numba.
+        """
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True)
+def _cross(ax, ay, bx, by, cx, cy):
+    """z-component of the cross product of (b - a) and (c - a), positive if
+    a, b, c turn counter-clockwise.
+    """
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+
+@njit(cache=True)
+def _segmentsIntersect(verts, i, j, k, l):
+    """Check whether segments i-j and k-l intersect, including touching.
+    """
+    d1 = _cross(verts[k, 0], verts[k, 1], verts[l, 0], verts[l, 1],
+                verts[i, 0], verts[i, 1])
+    d2 = _cross(verts[k, 0], verts[k, 1], verts[l, 0], verts[l, 1],
+                verts[j, 0], verts[j, 1])
+    d3 = _cross(verts[i, 0], verts[i, 1], verts[j, 0], verts[j, 1],
+                verts[k, 0], verts[k, 1])
+    d4 = _cross(verts[i, 0], verts[i, 1], verts[j, 0], verts[j, 1],
+                verts[l, 0], verts[l, 1])
+    if d1 * d2 > 0.0 or d3 * d4 > 0.0:
+        return False
+    if d1 == 0.0 and d2 == 0.0:
+        # collinear, intersect only if the segments overlap
+        for axis in range(2):
+            if (max(verts[i, axis], verts[j, axis]) <
+                    min(verts[k, axis], verts[l, axis])):
+                return False
+            if (max(verts[k, axis], verts[l, axis]) <
+                    min(verts[i, axis], verts[j, axis])):
+                return False
+    return True
+
+
+@njit(cache=True)
+def _isSimple(verts):
+    """Check that a closed loop of vertices has no zero-length edges and
+    that no two non-adjacent edges touch.
+    """
+    n = verts.shape[0]
+    for i in range(n):
+        j = (i + 1) % n
+        if verts[i, 0] == verts[j, 0] and verts[i, 1] == verts[j, 1]:
+            return False
+    for i in range(n):
+        for k in range(i + 2, n):
+            if i == 0 and k == n - 1:
+                continue  # adjacent through the closing edge
+            if _segmentsIntersect(verts, i, (i + 1) % n, k, (k + 1) % n):
+                return False
+    return True
+
+
+@njit(cache=True)
+def earclip(verts):
+    """Split a simple polygon into triangles.
+
+    Parameters
+    ----------
+    verts : ndarray
+        Nx2 array of vertices (float64) in order around the polygon. The
+        first vertex should not be repeated at the end.
+
+    Returns
+    -------
+    ndarray
+        Mx2 array of vertices, each consecutive three forming a triangle
+        (suitable for drawing with `GL_TRIANGLES`). Empty if the polygon
+        could not be tesselated this way, because it has fewer than three
+        vertices, crosses itself or is degenerate, in which case the GLU
+        tesselator should be used instead.
+
+    """
+    n = verts.shape[0]
+    out = numpy.empty((max(n - 2, 0) * 3, 2), dtype=numpy.float64)
+    if n < 3 or not _isSimple(verts):
+        return out[:0]
+
+    # work counter-clockwise, so ears are the vertices which turn left
+    area = 0.0
+    for i in range(n):
+        j = (i + 1) % n
+        area += verts[i, 0] * verts[j, 1] - verts[j, 0] * verts[i, 1]
+    if area == 0.0:
+        return out[:0]
+    idx = numpy.arange(n)
+    if area < 0.0:
+        idx = idx[::-1].copy()
+
+    nOut = 0
+    remaining = n
+    while remaining > 3:
+        found = False
+        for k in range(remaining):
+            a = idx[(k - 1) % remaining]
+            b = idx[k]
+            c = idx[(k + 1) % remaining]
+            ax, ay = verts[a, 0], verts[a, 1]
+            bx, by = verts[b, 0], verts[b, 1]
+            cx, cy = verts[c, 0], verts[c, 1]
+            if _cross(ax, ay, bx, by, cx, cy) <= 0.0:
+                continue  # reflex or collinear, not an ear
+            # an ear if no other vertex lies in (or on) the triangle
+            isEar = True
+            for m in range(remaining):
+                p = idx[m]
+                if p == a or p == b or p == c:
+                    continue
+                px, py = verts[p, 0], verts[p, 1]
+                if (_cross(ax, ay, bx, by, px, py) >= 0.0 and
+                        _cross(bx, by, cx, cy, px, py) >= 0.0 and
+                        _cross(cx, cy, ax, ay, px, py) >= 0.0):
+                    isEar = False
+                    break
+            if not isEar:
+                continue
+            # clip the ear
+            for v in (a, b, c):
+                out[nOut, 0] = verts[v, 0]
+                out[nOut, 1] = verts[v, 1]
+                nOut += 1
+            for m in range(k, remaining - 1):
+                idx[m] = idx[m + 1]
+            remaining -= 1
+            found = True
+            break
+        if not found:
+            return out[:0]
+
+    for m in range(3):
+        out[nOut, 0] = verts[idx[m], 0]
+        out[nOut, 1] = verts[idx[m], 1]
+        nOut += 1
+
+    return out[:nOut]
@@ -1,5 +1,8 @@
+import numpy as np
 import pytest
 from psychopy import visual
+from psychopy.contrib import tesselate_numba
+from psychopy.visual import shape as shapeModule
 from .test_basevisual import _TestColorMixin, _TestUnitsMixin
 from psychopy.tests.test_experiment.test_component_compile_python import _TestBoilerplateMixin
 
@@ -21,3 +24,191 @@ class TestShape(_TestColorMixin, _TestUnitsMixin, _TestBoilerplateMixin):
         self.fillUsed = True
         # Shape has no foreground color
         self.foreUsed = False
+
+    def test_batch(self):
+        # shapes drawn as a batch should look the same as drawn individually
+        shapes = [
+            visual.Rect(self.win, units="pix", pos=(-32, 0), size=(40, 40),
+                        fillColor="red", lineColor=None),
+            visual.ShapeStim(self.win, units="pix", pos=(32, 0), size=40,
+                             vertices="cross", fillColor="blue",
+                             lineColor=None),
+        ]
+        self.win.flip()
+        for shape in shapes:
+            shape.draw()
+        individual = np.array(self.win._getFrame(buffer="back"), dtype=int)
+        self.win.flip()
+
+        batch = visual.ShapeBatch(self.win)
+        for shape in shapes:
+            shape.addToBatch(batch)
+        assert len(batch) == 2
+        batch.draw()
+        batched = np.array(self.win._getFrame(buffer="back"), dtype=int)
+        self.win.flip()
+        assert np.abs(individual - batched).max() <= 1
+
+        # changes to a shape should be picked up on the next draw
+        shapes[0].pos = (-16, 0)
+        batch.draw()
+        moved = np.array(self.win._getFrame(buffer="back"), dtype=int)
+        self.win.flip()
+        assert np.abs(batched - moved).max() > 1
+
+    def test_tesselate_order(self, monkeypatch):
+        # convex shapes are fanned without ear-clipping, other simple shapes
+        # are ear-clipped and anything else goes to GLU
+        calls = []
+
+        def earclip(verts):
+            calls.append(verts)
+            return tesselate_numba.earclip(verts)
+
+        monkeypatch.setattr(shapeModule, "_earclip", earclip)
+        square = visual.ShapeStim(self.win, vertices="square")
+        assert not calls
+        assert np.allclose(square._tesselVertices,
+                           square.vertices[shapeModule._fanIndices(4)])
+        assert _trianglesArea(square._tesselVertices) == pytest.approx(1)
+
+        cross = visual.ShapeStim(self.win, vertices="cross")
+        assert len(calls) == 1
+        assert _trianglesArea(cross._tesselVertices) == pytest.approx(
+            _polygonArea(cross.vertices))
+
+        # self-intersecting, so ear-clipping gives up and GLU is used
+        bowtie = visual.ShapeStim(
+            self.win, vertices=[(-.5, -.5), (.5, .5), (.5, -.5), (-.5, .5)])
+        assert len(calls) == 2
+        assert len(bowtie._tesselVertices) % 3 == 0
+        assert _trianglesArea(bowtie._tesselVertices) == pytest.approx(0.5)
+
+
+    def test_numba_lazy(self, monkeypatch):
+        # numba helpers are only loaded once a shape needs ear-clipping
+        for name in ("_earclip", "_numbaHelpersLoaded", "_transformVerticesImpl"):
+            monkeypatch.setattr(shapeModule, name, getattr(shapeModule, name))
+        monkeypatch.setattr(shapeModule, "_earclip", None)
+        monkeypatch.setattr(shapeModule, "_numbaHelpersLoaded", False)
+        visual.ShapeStim(self.win, vertices="square")
+        assert not shapeModule._numbaHelpersLoaded
+        visual.ShapeStim(self.win, vertices="cross")
+        assert shapeModule._numbaHelpersLoaded
+        assert (shapeModule._earclip is None) == (not tesselate_numba.haveNumba)
+
+
+def _polygonArea(verts):
+    """Area of a simple polygon, by the shoelace formula."""
+    x, y = np.asarray(verts, dtype=float).T
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def _trianglesArea(verts):
+    """Total area of triangles given as consecutive threes of vertices."""
+    a, b, c = np.asarray(verts, dtype=float).reshape(-1, 3, 2).transpose(1, 0, 2)
+    ab, ac = b - a, c - a
+    return (np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2).sum()
+
+
+# simple (hole-less, not self-intersecting) polygons, convex and concave
+_convexShapes = ("triangle", "rectangle")
+_concaveShapes = ("cross", "star7", "arrow")
+_bowtie = np.array([(-.5, -.5), (.5, .5), (.5, -.5), (-.5, .5)])
+
+
+class TestShapeHelpers:
+    # Helpers used by shapes when tesselating and drawing, which don't need a window
+
+    @pytest.mark.parametrize("name", _convexShapes + _concaveShapes)
+    def test_earclip(self, name):
+        verts = shapeModule.knownShapes[name]
+        triangles = tesselate_numba.earclip(np.ascontiguousarray(verts))
+        assert triangles.shape == ((len(verts) - 2) * 3, 2)
+        assert _trianglesArea(triangles) == pytest.approx(_polygonArea(verts))
+        # works either way around
+        triangles = tesselate_numba.earclip(np.ascontiguousarray(verts[::-1]))
+        assert _trianglesArea(triangles) == pytest.approx(_polygonArea(verts))
+
+    def test_earclip_not_simple(self):
+        # self-intersecting or degenerate polygons give no triangles, so the GLU
+        # tesselator can be used instead
+        assert not tesselate_numba._isSimple(_bowtie)
+        assert len(tesselate_numba.earclip(_bowtie)) == 0
+        line = np.array([(0., 0.), (1., 0.), (2., 0.)])
+        assert len(tesselate_numba.earclip(line)) == 0
+        repeated = np.array([(0., 0.), (1., 0.), (1., 0.), (0., 1.)])
+        assert not tesselate_numba._isSimple(repeated)
+        for name in _convexShapes + _concaveShapes:
+            assert tesselate_numba._isSimple(
+                np.ascontiguousarray(shapeModule.knownShapes[name]))
+
+    @pytest.mark.parametrize("name", _convexShapes + _concaveShapes)
+    def test_isConvex(self, name):
+        verts = shapeModule.knownShapes[name]
+        assert shapeModule._isConvex(verts) == (name in _convexShapes)
+        assert shapeModule._isConvex(verts[::-1]) == (name in _convexShapes)
+
+    def test_isConvex_not_simple(self):
+        assert not shapeModule._isConvex(_bowtie)
+        # a pentagram turns the same way at every vertex, but goes around twice
+        angles = np.radians(np.arange(5) * 144)
+        pentagram = np.column_stack((np.sin(angles), np.cos(angles)))
+        assert not shapeModule._isConvex(pentagram)
+
+    @pytest.mark.parametrize("nVerts", [3, 4, 7, 32])
+    def test_fanIndices(self, nVerts):
+        angles = np.linspace(0, 2 * np.pi, nVerts, endpoint=False)
+        verts = np.column_stack((np.cos(angles), np.sin(angles)))
+        idx = shapeModule._fanIndices(nVerts)
+        assert len(idx) == (nVerts - 2) * 3
+        assert _trianglesArea(verts[idx]) == pytest.approx(_polygonArea(verts))
+
+    def test_thickLineTriangles(self):
+        # a single segment is one quad
+        line = np.array([(0., 0.), (10., 0.)])
+        triangles = shapeModule._thickLineTriangles(line, 2, closed=False)
+        assert triangles.shape == (6, 2)
+        assert _trianglesArea(triangles) == pytest.approx(20)
+        assert np.allclose(np.sort(np.unique(triangles[:, 1])), [-1, 1])
+        # open lines have a quad per segment, mitered at the corners so the area
+        # is the length of the line times its width
+        corner = np.array([(0., 0.), (10., 0.), (10., 10.), (0., 10.)])
+        triangles = shapeModule._thickLineTriangles(corner, 2, closed=False)
+        assert triangles.shape == (18, 2)
+        assert _trianglesArea(triangles) == pytest.approx(60)
+        # closed lines also join the last vertex back to the first
+        triangles = shapeModule._thickLineTriangles(corner, 2, closed=True)
+        assert triangles.shape == (24, 2)
+        assert _trianglesArea(triangles) == pytest.approx(12 ** 2 - 8 ** 2)
+        # corners too sharp to miter are bevelled, with the segments keeping
+        # their full width and an extra triangle on the outside of the corner
+        acute = np.array([(0., 0.), (10., 0.), (0., 2.)])
+        triangles = shapeModule._thickLineTriangles(acute, 2, closed=False)
+        assert triangles.shape == (15, 2)
+        for i, (start, end) in enumerate(zip(acute[:-1], acute[1:])):
+            direction = (end - start) / np.hypot(*(end - start))
+            offsets = triangles[i * 6:i * 6 + 6] - start
+            distances = offsets[:, 0] * direction[1] - offsets[:, 1] * direction[0]
+            assert np.allclose(np.abs(distances), 1)
+        bevel = triangles[12:]
+        assert np.allclose(bevel[0], acute[1])
+        assert np.allclose(np.hypot(*(bevel[1:] - acute[1]).T), 1)
+        assert np.allclose(bevel[1], (10, -1))
+        assert triangles[:, 0].max() < 11
+        # nothing to draw with less than two vertices
+        assert len(shapeModule._thickLineTriangles(line[:1], 2, closed=True)) == 0
+
+    def test_borderTriangles(self):
+        square = np.array([(0., 0.), (10., 0.), (10., 10.), (0., 10.)])
+        triangles = shapeModule._borderTriangles(square, 2, closed=True)
+        assert np.allclose(
+            triangles, shapeModule._thickLineTriangles(square, 2, closed=True))
+        # shapes with holes have a border for each loop
+        loops = np.array([square, square / 2 + 2.5])
+        for closed, nVerts in ((True, 48), (False, 36)):
+            triangles = shapeModule._borderTriangles(loops, 2, closed=closed)
+            assert triangles.shape == (nVerts, 2)
+            assert np.allclose(triangles[:nVerts // 2],
+                               shapeModule._thickLineTriangles(
+                                   loops[0], 2, closed=closed))
@@ -1,4 +1,8 @@
+import numpy as np
+import pytest
 from psychopy import visual, layout
+from psychopy.colors import Color
+from psychopy.visual.target import targetFromDict
 from .test_basevisual import _TestColorMixin, _TestUnitsMixin
 
 class TestTarget(_TestUnitsMixin):
@@ -33,3 +37,90 @@ class TestTarget(_TestUnitsMixin):
             # Check that the target's size is set to twice the radius value
             assert self.obj.outer._size == layout.Size(case['outer']*2, case['units'], self.win)
             assert self.obj.inner._size == layout.Size(case['inner']*2, case['units'], self.win)
+
+    def test_from_dict(self):
+        target = visual.TargetStim(self.win, "TargetStim", units='pix',
+                                   radius=40, innerRadius=10, lineWidth=4, innerLineWidth=2,
+                                   fillColor="blue", borderColor="white",
+                                   innerFillColor="red", innerBorderColor="green")
+        spec = dict(target)
+        # Making a target from its own dict should give the same dict back
+        copied = targetFromDict(self.win, dict(spec), units='pix')
+        copiedSpec = dict(copied)
+        assert list(copiedSpec) == list(spec)
+        for key, value in spec.items():
+            assert np.allclose(copiedSpec[key], value), key
+        # Colors left out of the spec are transparent
+        partial = {key: value for key, value in spec.items() if not key.endswith("_color")}
+        copied = targetFromDict(self.win, partial, units='pix')
+        assert all(partial[key] is None for key in spec if key.endswith("_color"))
+        assert copied.outerRadius == 40
+        assert copied.innerRadius == 10
+        assert not copied.outer._fillColor
+        assert not copied.outer._borderColor
+
+    def test_radius_from_shapes(self):
+        # Radii should follow the shapes' sizes and units, even when these are set on the shapes directly
+        target = visual.TargetStim(self.win, "TargetStim", units='pix', radius=40, innerRadius=10)
+        assert target.outerRadius == 40
+        assert target.innerRadius == 10
+        target.outer.size = (60, 60)
+        target.inner.size = (30, 30)
+        assert target.outerRadius == 30
+        assert target.innerRadius == 15
+        target.outer.units = target.inner.units = 'height'
+        assert target.outerRadius == pytest.approx(layout.Size((60, 60), 'pix', self.win).height[1] / 2)
+        assert target.innerRadius == pytest.approx(layout.Size((30, 30), 'pix', self.win).height[1] / 2)
+        assert dict(target)['outer_diameter'] == target.outerRadius * 2
+
+    def test_colors_from_shapes(self):
+        # Colors given by dict(target) should follow the shapes' colors, even when these are set on the
+        # shapes directly
+        target = visual.TargetStim(self.win, "TargetStim", units='pix',
+                                   fillColor="blue", borderColor="white", innerFillColor="red")
+        assert np.allclose(dict(target)['outer_fill_color'], target.outer.fillColor)
+        target.outer.fillColor = "green"
+        target.inner.fillColor = "yellow"
+        spec = dict(target)
+        assert np.allclose(spec['outer_fill_color'], target.outer.fillColor)
+        assert np.allclose(spec['inner_fill_color'], target.inner.fillColor)
+        # Transparent colors are given as the color behind them
+        target.outer.fillColor = None
+        target.inner.fillColor = None
+        spec = dict(target)
+        assert np.allclose(spec['outer_fill_color'], self.win.color)
+        assert np.allclose(spec['inner_fill_color'], self.win.color)
+
+    def test_lazy_inner(self):
+        # An inner shape which can't be seen isn't made until it's needed
+        kwargs = dict(units='pix', radius=40, innerRadius=10, lineWidth=4,
+                      fillColor="blue", innerFillColor=None, innerBorderColor=None)
+        target = visual.TargetStim(self.win, "TargetStim", **kwargs)
+        assert target._inner is None
+        target.draw()
+        assert target._inner is None
+        # ...but is made correctly when it's accessed
+        inner = target.inner
+        assert target._inner is inner
+        assert inner._size == layout.Size((20, 20), 'pix', self.win)
+        assert inner.lineWidth == 4
+        assert not inner._fillColor
+        assert not inner._borderColor
+        assert np.allclose(inner.pos, target.pos)
+        # ...or when the inner radius is set
+        target = visual.TargetStim(self.win, "TargetStim", **kwargs)
+        target.innerRadius = 15
+        assert target._inner is not None
+        assert target.inner._size == layout.Size((30, 30), 'pix', self.win)
+        # ...with the style set after the target was made
+        target = visual.TargetStim(self.win, "TargetStim", **kwargs)
+        target.style = "cross"
+        assert target._inner is None
+        assert np.allclose(target.inner.vertices, visual.ShapeStim(self.win, vertices="cross").vertices)
+        # An inner shape which can be seen, or is drawn automatically, is made straight away
+        target = visual.TargetStim(self.win, "TargetStim", **dict(kwargs, innerFillColor="red"))
+        assert target._inner is not None
+        assert np.allclose(target.inner.fillColor, Color("red").rgb)
+        target = visual.TargetStim(self.win, "TargetStim", autoDraw=True, **kwargs)
+        assert target._inner is not None
+        target.outer.autoDraw = target.inner.autoDraw = False
@@ -83,6 +83,7 @@ from psychopy.visual.noise import NoiseStim
 
 # stimuli derived from BaseShapeStim
 from psychopy.visual.shape import ShapeStim
+from psychopy.visual.shape import ShapeBatch
 
 # stimuli derived from ShapeStim
 from psychopy.visual.line import Line
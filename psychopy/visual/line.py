@@ -125,6 +125,7 @@ class Line(ShapeStim):
 
     _defaultFillColor = None
     _defaultLineColor = "white"
+    _isLine = True
 
     def __init__(self,
                  win,
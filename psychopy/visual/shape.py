@@ -7,7 +7,7 @@
 # Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2024 Open Science Tools Ltd.
 # Distributed under the terms of the GNU General Public License (GPL)
 
-import copy
+import ctypes
 import numpy
 
 # Ensure setting pyglet.options['debug_gl'] to False is done prior to any
@@ -26,30 +26,55 @@ from psychopy.colors import Color
 from psychopy.tools.attributetools import (attributeSetter,  # logAttrib,
                                            setAttribute)
 from psychopy.tools.arraytools import val2array
+import psychopy.tools.gltools as gt
 from psychopy.visual.basevisual import (
     BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin, WindowMixin
 )
 # from psychopy.visual.helpers import setColor
-import psychopy.visual
 
 pyglet.options['debug_gl'] = False
 GL = pyglet.gl
 
+# GL functions and constants used when drawing, bound to module level names
+# to save looking them up on `GL` for every call
+_glActiveTexture = GL.glActiveTexture
+_glBindTexture = GL.glBindTexture
+_glColor4f = GL.glColor4f
+_glDisable = GL.glDisable
+_glDrawArrays = GL.glDrawArrays
+_glEnable = GL.glEnable
+_glLineWidth = GL.glLineWidth
+_glMultiDrawArrays = GL.glMultiDrawArrays
+_glPopMatrix = GL.glPopMatrix
+_glPushMatrix = GL.glPushMatrix
+_glUseProgram = GL.glUseProgram
+_GL_COLOR_ARRAY = GL.GL_COLOR_ARRAY
+_GL_LINE_LOOP = GL.GL_LINE_LOOP
+_GL_LINE_SMOOTH = GL.GL_LINE_SMOOTH
+_GL_LINE_STRIP = GL.GL_LINE_STRIP
+_GL_MULTISAMPLE = GL.GL_MULTISAMPLE
+_GL_POLYGON = GL.GL_POLYGON
+_GL_TEXTURE0 = GL.GL_TEXTURE0
+_GL_TEXTURE1 = GL.GL_TEXTURE1
+_GL_TEXTURE_2D = GL.GL_TEXTURE_2D
+_GL_TRIANGLES = GL.GL_TRIANGLES
+_GL_VERTEX_ARRAY = GL.GL_VERTEX_ARRAY
+
 
 knownShapes = {
-    "triangle": [
+    "triangle": numpy.array([
         (+0.0, 0.5),  # Point
         (-0.5, -0.5),  # Bottom left
         (+0.5, -0.5),  # Bottom right
-    ],
-    "rectangle": [
+    ], dtype=float),
+    "rectangle": numpy.array([
         [-.5,  .5],  # Top left
         [ .5,  .5],  # Top right
         [ .5, -.5],  # Bottom left
         [-.5, -.5],  # Bottom right
-    ],
+    ], dtype=float),
     "circle": "circle",  # Placeholder, value calculated on set based on line width
-    "cross": [
+    "cross": numpy.array([
         (-0.1, +0.5),  # up
         (+0.1, +0.5),
         (+0.1, +0.1),
@@ -62,8 +87,8 @@ knownShapes = {
         (-0.5, -0.1),  # left
         (-0.5, +0.1),
         (-0.1, +0.1),
-    ],
-    "star7": [
+    ], dtype=float),
+    "star7": numpy.array([
         (0.0, 0.5),
         (0.09, 0.18),
         (0.39, 0.31),
@@ -78,8 +103,8 @@ knownShapes = {
         (-0.19, 0.04),
         (-0.39, 0.31),
         (-0.09, 0.18)
-    ],
-    "arrow": [
+    ], dtype=float),
+    "arrow": numpy.array([
         (0.0, 0.5),
         (-0.5, 0.0),
         (-1/6, 0.0),
@@ -87,12 +112,487 @@ knownShapes = {
         (1/6, -0.5),
         (1/6, 0.0),
         (0.5, 0.0)
-    ],
+    ], dtype=float),
 }
 knownShapes['square'] = knownShapes['rectangle']
 knownShapes['star'] = knownShapes['star7']
 
 
+# whether persistently mapped buffers can be used, checked on first upload
+_haveBufferStorage = None
+
+
+def _checkBufferStorage():
+    """Check whether the OpenGL context supports immutable buffer storage
+    (OpenGL 4.4 or `GL_ARB_buffer_storage`), needed for persistently mapped
+    vertex buffers.
+    """
+    global _haveBufferStorage
+    if _haveBufferStorage is None:
+        try:
+            _haveBufferStorage = hasattr(GL, 'glBufferStorage') and (
+                GL.gl_info.have_version(4, 4) or
+                GL.gl_info.have_extension('GL_ARB_buffer_storage'))
+        except Exception:
+            _haveBufferStorage = False
+    return _haveBufferStorage
+
+
+# number of regions in a persistently mapped buffer, see _createMappedBuffer
+_nMappedRegions = 3
+
+
+def _createMappedBuffer(nVerts, size=2):
+    """Create a vertex buffer which stays mapped to client memory.
+
+    Vertices are written straight to the mapped array, so updating them
+    doesn't need any calls to OpenGL or a copy by the driver. The buffer is
+    split into `_nMappedRegions` regions, each of which can hold at least
+    `nVerts` vertices, used in turn. A region is fenced when the buffer
+    moves on from it, so it's only written again once the GPU has finished
+    drawing from it, which with three regions has normally happened long
+    before, so the CPU doesn't wait for the GPU. Drawing from the buffer
+    doesn't need any fences, so static shapes don't add any GL calls.
+
+    The mapped regions are kept in `vbo.userData['mapped']`, the region
+    last written in `vbo.userData['region']` and its offset (in floats, as
+    for :func:`~psychopy.tools.gltools.setVertexAttribPointer`) in
+    `vbo.userData['offset']`. Delete the buffer with
+    :func:`_deleteVertexBuffer`.
+
+    Parameters
+    ----------
+    nVerts : int
+        Number of vertices the buffer needs to hold.
+    size : int
+        Number of components per vertex.
+
+    Returns
+    -------
+    :class:`~psychopy.tools.gltools.VertexBufferInfo`
+        Buffer descriptor.
+
+    """
+    # leave room to grow, so shapes whose number of vertices changes
+    # don't need a new buffer every time
+    capacity = max(2 * nVerts, 64)
+    nbytes = _nMappedRegions * capacity * size * ctypes.sizeof(GL.GLfloat)
+    flags = (GL.GL_MAP_WRITE_BIT | GL.GL_MAP_PERSISTENT_BIT |
+             GL.GL_MAP_COHERENT_BIT)
+
+    name = GL.GLuint()
+    GL.glGenBuffers(1, ctypes.byref(name))
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, name)
+    GL.glBufferStorage(GL.GL_ARRAY_BUFFER, nbytes, None, flags)
+    ptr = GL.glMapBufferRange(GL.GL_ARRAY_BUFFER, 0, nbytes, flags)
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    mapped = numpy.ctypeslib.as_array(
+        ctypes.cast(ptr, ctypes.POINTER(GL.GLfloat)),
+        shape=(_nMappedRegions, capacity, size))
+
+    return gt.VertexBufferInfo(
+        name, GL.GL_ARRAY_BUFFER, GL.GL_DYNAMIC_DRAW, GL.GL_FLOAT, nbytes,
+        size * ctypes.sizeof(GL.GLfloat), (nVerts, size),
+        userData={'mapped': mapped, 'fences': [None] * _nMappedRegions,
+                  'region': 0, 'offset': 0})
+
+
+def _vertexBufferOffset(vbo):
+    """Offset (in floats) of the vertices last uploaded to `vbo`, to pass to
+    :func:`~psychopy.tools.gltools.setVertexAttribPointer`. Always 0 except
+    for persistently mapped buffers.
+    """
+    return vbo.userData.get('offset', 0)
+
+
+# times to wait (1s each) for the GPU to pass a fence before giving up
+_fenceWaitTries = 5
+
+
+def _waitForFence(fence):
+    """Wait until the GPU has passed `fence`, then delete it.
+    """
+    for _ in range(_fenceWaitTries):
+        status = GL.glClientWaitSync(
+            fence, GL.GL_SYNC_FLUSH_COMMANDS_BIT, 1000000000)  # 1s
+        if status != GL.GL_TIMEOUT_EXPIRED:
+            break
+    else:
+        logging.warning(
+            "Timed out waiting for the GPU to finish drawing from a vertex "
+            "buffer, waiting for all drawing to finish instead.")
+        status = GL.GL_WAIT_FAILED
+    if status == GL.GL_WAIT_FAILED:
+        # can't tell when the GPU is done, so wait for everything
+        GL.glFinish()
+    GL.glDeleteSync(fence)
+
+
+def _deleteVertexBuffer(vbo):
+    """Delete a vertex buffer made by :func:`_updateVertexBuffer`, along with
+    any fences for it.
+    """
+    for fence in vbo.userData.get('fences', ()):
+        if fence is not None:
+            GL.glDeleteSync(fence)
+    gt.deleteVBO(vbo)
+
+
+def _updateVertexBuffer(vbo, verts, size=2):
+    """Upload vertices to a vertex buffer object (VBO), creating the buffer
+    if `vbo` is `None`.
+
+    Buffers are kept between frames so vertex data only needs to be sent to
+    the graphics card when it changes. We don't wrap the buffer in a vertex
+    array object as those can't be shared between windows. Vertices are
+    stored as single precision floats, pixel coordinates don't need more and
+    it halves the amount of data sent.
+
+    Where supported, buffers are persistently mapped (see
+    :func:`_createMappedBuffer`) and vertices are copied straight into the
+    next region of them, otherwise they are uploaded with `glBufferSubData`.
+    Either way, use :func:`_vertexBufferOffset` when pointing GL at the
+    vertices.
+
+    Parameters
+    ----------
+    vbo : :class:`~psychopy.tools.gltools.VertexBufferInfo` or None
+        Buffer to upload to. If `None`, a new buffer is created.
+    verts : ndarray
+        Nx2 array of vertices (in pixels) to upload.
+    size : int
+        Number of components per vertex, 2 for vertices or 4 for RGBA
+        colors.
+
+    Returns
+    -------
+    :class:`~psychopy.tools.gltools.VertexBufferInfo`
+        Buffer descriptor, which should be kept for subsequent calls. This
+        may not be `vbo` if the buffer had to be replaced.
+
+    """
+    verts = numpy.ascontiguousarray(
+        verts, dtype=numpy.float32).reshape(-1, size)
+    nVerts = verts.shape[0]
+    if vbo is not None and 'mapped' in vbo.userData and \
+            nVerts > vbo.userData['mapped'].shape[1]:
+        # mapped buffers can't be resized, replace with a bigger one
+        _deleteVertexBuffer(vbo)
+        vbo = None
+    if vbo is None:
+        if not _checkBufferStorage():
+            return gt.createVBO(verts, dataType=GL.GL_FLOAT,
+                                usage=GL.GL_DYNAMIC_DRAW)
+        vbo = _createMappedBuffer(nVerts, size)
+
+    if 'mapped' in vbo.userData:
+        userData = vbo.userData
+        mapped = userData['mapped']
+        fences = userData['fences']
+        # everything drawn from the current region has been sent by now, so
+        # fence it before moving on to the next
+        fences[userData['region']] = GL.glFenceSync(
+            GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        region = (userData['region'] + 1) % _nMappedRegions
+        # the GPU must be done drawing from the region before it's written,
+        # normally it was drawn from frames ago so this doesn't wait
+        if fences[region] is not None:
+            _waitForFence(fences[region])
+            fences[region] = None
+        mapped[region, :nVerts] = verts
+        userData['region'] = region
+        userData['offset'] = region * mapped.shape[1] * size
+        vbo.shape = verts.shape
+        return vbo
+
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo.name)
+    if verts.nbytes == vbo.size:
+        # same size, so just overwrite the existing data store
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, verts.nbytes, verts.ctypes)
+    else:
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, verts.nbytes, verts.ctypes,
+                        GL.GL_DYNAMIC_DRAW)
+        vbo.size = verts.nbytes
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    vbo.shape = verts.shape
+
+    return vbo
+
+
+def _transformVerticesNumpy(verts, scale, offset, rotation, pos):
+    """Scale, offset, rotate and then translate Nx2 vertices.
+    """
+    return (verts * scale + offset).dot(rotation) + pos
+
+
+def _transformVerticesLoop(verts, scale, offset, rotation, pos):
+    """Same as :func:`_transformVerticesNumpy`, in a single pass over the
+    vertices without intermediate arrays. Slow unless compiled with numba,
+    see :func:`loadNumbaHelpers`.
+    """
+    out = numpy.empty(verts.shape)
+    for i in range(verts.shape[0]):
+        x = verts[i, 0] * scale[0] + offset[0]
+        y = verts[i, 1] * scale[1] + offset[1]
+        out[i, 0] = x * rotation[0, 0] + y * rotation[1, 0] + pos[0]
+        out[i, 1] = x * rotation[0, 1] + y * rotation[1, 1] + pos[1]
+    return out
+
+
+# numpy until loadNumbaHelpers() has compiled the loop
+_transformVerticesImpl = _transformVerticesNumpy
+
+
+# ear-clipping tesselator compiled with numba, set by loadNumbaHelpers()
+_earclip = None
+# whether loadNumbaHelpers() has been called
+_numbaHelpersLoaded = False
+
+
+def loadNumbaHelpers():
+    """Import and compile the optional numba versions of the shape helpers.
+
+    Compiling takes a few seconds, so this is only done the first time a
+    shape which isn't convex is made (see :func:`_getEarclip`), and shapes
+    use numpy (or GLU) until then. Experiments can call it before any trials
+    to make sure this doesn't happen during one. Does nothing if numba isn't
+    installed or it's already been called.
+    """
+    global _earclip, _transformVerticesImpl, _numbaHelpersLoaded
+    if _numbaHelpersLoaded:
+        return
+    _numbaHelpersLoaded = True
+    from psychopy.contrib import tesselate_numba
+    if not tesselate_numba.haveNumba:
+        return
+    logging.info("Compiling numba helpers for shapes, this is only done once")
+    from numba import njit
+    # compile by calling with the same types used when drawing (float64
+    # arrays, see _transformVertices)
+    square = numpy.array([[0., 0.], [1., 0.], [1., 1.], [0., 1.]])
+    tesselate_numba.earclip(square)
+    transformVertices = njit(cache=True, fastmath=True)(
+        _transformVerticesLoop)
+    transformVertices(square, numpy.ones(2), numpy.zeros(2), numpy.eye(2),
+                      numpy.zeros(2))
+    _earclip = tesselate_numba.earclip
+    _transformVerticesImpl = transformVertices
+
+
+def _getEarclip():
+    """Get the numba ear-clipping tesselator, loading it on first use, or
+    `None` if numba isn't installed.
+    """
+    if _earclip is None:
+        loadNumbaHelpers()
+    return _earclip
+
+
+def _transformVertices(verts, scale, offset, rotation, pos):
+    """Transform vertices to their final position, as `(verts * scale +
+    offset) @ rotation + pos`.
+
+    Parameters
+    ----------
+    verts : array_like
+        Nx2 (or nxNx2 for shapes with holes) vertices.
+    scale : ndarray
+        Multiplier for x and y, i.e. the size with any flip applied.
+    offset : ndarray
+        Offset added to the scaled vertices, for the anchor.
+    rotation : ndarray
+        2x2 rotation matrix, multiplying vertices (as row vectors) from the
+        right.
+    pos : ndarray
+        Position added after rotation.
+
+    Returns
+    -------
+    ndarray
+        Transformed vertices, with the same shape as `verts`.
+
+    """
+    verts = numpy.asarray(verts, dtype=float)
+    # always pass float64 arrays, so the numba version is never compiled
+    # again for other types while drawing
+    out = _transformVerticesImpl(
+        numpy.ascontiguousarray(verts.reshape(-1, 2)),
+        numpy.asarray(scale, dtype=float), numpy.asarray(offset, dtype=float),
+        numpy.asarray(rotation, dtype=float), numpy.asarray(pos, dtype=float))
+    return out.reshape(verts.shape)
+
+
+def _isVisible(color):
+    """Check whether a color is to be drawn at all, i.e. it wasn't set to
+    `None`. Equivalent to `color != None`, without going through
+    `Color.__eq__` on every draw.
+    """
+    return color._requested is not None
+
+
+def _unbindTextures():
+    """Load null textures into multitexteureARB - or they modulate glColor.
+
+    Only needed with the fixed-function pipeline, the shader programs used
+    for shapes don't sample textures so whatever is bound doesn't matter.
+    """
+    _glActiveTexture(_GL_TEXTURE0)
+    _glEnable(_GL_TEXTURE_2D)
+    _glBindTexture(_GL_TEXTURE_2D, 0)
+    _glActiveTexture(_GL_TEXTURE1)
+    _glEnable(_GL_TEXTURE_2D)
+    _glBindTexture(_GL_TEXTURE_2D, 0)
+
+
+def _fanIndices(nVerts):
+    """Indices splitting a convex polygon with `nVerts` vertices into a fan
+    of triangles around its first vertex, for use with `GL_TRIANGLES`.
+    """
+    idx = numpy.empty((nVerts - 2) * 3, dtype=int)
+    idx[0::3] = 0
+    idx[1::3] = numpy.arange(1, nVerts - 1)
+    idx[2::3] = numpy.arange(2, nVerts)
+    return idx
+
+
+def _isConvex(verts):
+    """Check whether a loop of Nx2 vertices forms a convex polygon, i.e.
+    turns the same way at every vertex and only goes around once (which
+    rules out star shapes like pentagrams).
+    """
+    if verts.ndim != 2 or verts.shape[0] < 3:
+        return False
+    edges = numpy.roll(verts, -1, axis=0) - verts
+    nextEdges = numpy.roll(edges, -1, axis=0)
+    cross = edges[:, 0] * nextEdges[:, 1] - edges[:, 1] * nextEdges[:, 0]
+    if not (numpy.all(cross >= 0) or numpy.all(cross <= 0)) or \
+            not numpy.any(cross):
+        return False
+    turning = numpy.arctan2(cross, (edges * nextEdges).sum(axis=1)).sum()
+    return abs(abs(turning) - 2 * numpy.pi) < 1e-6
+
+
+# widest lines OpenGL will draw, as (aliased, smooth), checked on first use
+_maxLineWidths = None
+
+
+def _getMaxLineWidth(smooth=False):
+    """Get the widest line (in pixels) OpenGL can draw, for aliased or smooth
+    (`GL_LINE_SMOOTH`) lines. Needs a current GL context.
+
+    Borders wider than the aliased maximum are drawn as triangles, smooth or
+    not. Many drivers report a much lower maximum for smooth lines (a few
+    pixels), so using that would draw ordinary borders as triangles.
+    """
+    global _maxLineWidths
+    if _maxLineWidths is None:
+        aliasedRange = (GL.GLfloat * 2)(0.0, 0.0)
+        GL.glGetFloatv(GL.GL_ALIASED_LINE_WIDTH_RANGE, aliasedRange)
+        smoothRange = (GL.GLfloat * 2)(0.0, 0.0)
+        GL.glGetFloatv(GL.GL_SMOOTH_LINE_WIDTH_RANGE, smoothRange)
+        _maxLineWidths = (aliasedRange[1], smoothRange[1])
+    return _maxLineWidths[1 if smooth else 0]
+
+
+def _thickLineTriangles(verts, width, closed):
+    """Expand a line into triangles, for lines too wide for `glLineWidth`.
+
+    Each segment becomes a quad (two triangles) `width` pixels across, with
+    mitered joins between segments so there are no gaps at the corners.
+    Where a miter would be longer than 4 times the half width, i.e. at very
+    sharp corners, the segments are cut square at the corner instead and the
+    gap on the outside is filled with a triangle (a bevel join), so the line
+    keeps its width without spiking out.
+
+    Parameters
+    ----------
+    verts : ndarray
+        Nx2 vertices (in pixels) of the line.
+    width : float
+        Width of the line in pixels.
+    closed : bool
+        Join the last vertex back to the first, as for `GL_LINE_LOOP`.
+
+    Returns
+    -------
+    ndarray
+        Mx2 vertices, each consecutive three forming a triangle. The quads
+        for each segment come first, followed by any bevels.
+
+    """
+    verts = numpy.asarray(verts, dtype=float)
+    if verts.shape[0] < 2:
+        return verts[:0]
+    if closed:
+        segments = numpy.roll(verts, -1, axis=0) - verts
+    else:
+        segments = verts[1:] - verts[:-1]
+    lengths = numpy.hypot(segments[:, 0], segments[:, 1])
+    lengths[lengths == 0] = 1.0
+    normals = numpy.column_stack((-segments[:, 1], segments[:, 0]))
+    normals /= lengths[:, numpy.newaxis]
+    halfWidth = width / 2.0
+
+    # normals of the segments before and after each vertex
+    if closed:
+        normalsIn, normalsOut = numpy.roll(normals, 1, axis=0), normals
+    else:
+        normalsIn = numpy.vstack((normals[:1], normals))
+        normalsOut = numpy.vstack((normals, normals[-1:]))
+    miters = normalsIn + normalsOut
+    lengths = numpy.hypot(miters[:, 0], miters[:, 1])
+    lengths[lengths == 0] = 1.0
+    miters /= lengths[:, numpy.newaxis]
+    cosines = (miters * normalsOut).sum(axis=1)
+    bevel = cosines < 0.25
+    miters *= (halfWidth / numpy.where(bevel, 1.0, cosines))[:, numpy.newaxis]
+    # offsets of the ends of the segments leaving and arriving at each vertex
+    bevel = bevel[:, numpy.newaxis]
+    startOffsets = numpy.where(bevel, normalsOut * halfWidth, miters)
+    endOffsets = numpy.where(bevel, normalsIn * halfWidth, miters)
+
+    starts = verts[:segments.shape[0]]
+    ends = numpy.roll(verts, -1, axis=0) if closed else verts[1:]
+    startOffsets = startOffsets[:segments.shape[0]]
+    endOffsets = numpy.roll(endOffsets, -1, axis=0) if closed \
+        else endOffsets[1:]
+
+    triangles = numpy.empty((segments.shape[0], 6, 2))
+    triangles[:, 0] = starts + startOffsets
+    triangles[:, 1] = starts - startOffsets
+    triangles[:, 2] = ends + endOffsets
+    triangles[:, 3] = ends + endOffsets
+    triangles[:, 4] = starts - startOffsets
+    triangles[:, 5] = ends - endOffsets
+    triangles = triangles.reshape(-1, 2)
+
+    bevel = bevel[:, 0]
+    if not bevel.any():
+        return triangles
+    # fill the gap on the outside of each bevelled corner, which is on the
+    # right of lines turning left and vice versa
+    normalsIn, normalsOut = normalsIn[bevel], normalsOut[bevel]
+    turns = (normalsIn[:, 0] * normalsOut[:, 1] -
+             normalsIn[:, 1] * normalsOut[:, 0])
+    sides = numpy.where(turns > 0, -halfWidth, halfWidth)[:, numpy.newaxis]
+    bevels = numpy.empty((normalsIn.shape[0], 3, 2))
+    bevels[:, 0] = verts[bevel]
+    bevels[:, 1] = verts[bevel] + normalsIn * sides
+    bevels[:, 2] = verts[bevel] + normalsOut * sides
+    return numpy.concatenate((triangles, bevels.reshape(-1, 2)))
+
+
+def _borderTriangles(border, width, closed):
+    """Expand a border into triangles with :func:`_thickLineTriangles`,
+    handling the nxNx2 borders of shapes with holes.
+    """
+    if border.ndim == 3:
+        return numpy.concatenate(
+            [_thickLineTriangles(loop, width, closed) for loop in border])
+    return _thickLineTriangles(border, width, closed)
+
+
 class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
     """Create geometric (vector) shapes by defining vertex locations.
     This is a lazy-imported class, therefore import using full path 
@@ -115,6 +615,7 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
 
     _defaultFillColor = None
     _defaultLineColor = "black"
+    _isLine = False  # Line warns about widths OpenGL can't draw
 
     def __init__(self,
                  win,
@@ -156,6 +657,22 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
                                             autoLog=False)
         self.draggable = draggable
 
+        # vertex buffer is created on first draw
+        self._vbo = None
+        self._needVertexUpload = True
+        # colors as passed to glColor4f, calculated on first draw, stored
+        # with the rendered color array they were made from
+        self._fillRGBA = self._borderRGBA = None
+        # draw function for the current fill and border, see _selectDrawFn
+        self._drawFn = None
+        self._borderMode = _GL_LINE_LOOP
+        # borders too wide for glLineWidth are drawn as triangles, stored in
+        # the vertex buffer from _thickOffset
+        self._thickBorder = False
+        self._thickOffset = self._nThickVerts = 0
+        # whether there's a fill and border to draw, set with the draw function
+        self._drawsFill = self._drawsBorder = False
+
         self.pos = pos
         self.closeShape = closeShape
         self.lineWidth = lineWidth
@@ -195,7 +712,9 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
 
         # Other stuff
         self.depth = depth
-        self.ori = numpy.array(ori, float)
+        # the ori setter stores a float, so only convert when we have to
+        self.ori = ori if isinstance(ori, (int, float)) else \
+            numpy.asarray(ori, float)
         self.size = size  # make sure that it's 2D
         self.vertices = vertices  # call attributeSetter
         self.anchor = anchor
@@ -217,10 +736,27 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
         if not isinstance(value, (float, int)):
             value = float(value)
 
-        if isinstance(self, psychopy.visual.Line):
-            if value > 127:
-                logging.warning("lineWidth is greater than max width supported by OpenGL. For lines thicker than 127px, please use a filled Rect instead.")
         self.__dict__['lineWidth'] = value
+        self._drawFn = None
+        # lines wider than OpenGL can draw are uploaded as triangles
+        self._needVertexUpload = True
+        self._checkLineWidth()
+
+    def _checkLineWidth(self):
+        """Warn if this is a smooth line too wide for OpenGL to draw smooth.
+        Wider lines are drawn as triangles, so only lines between the smooth
+        and aliased maximum widths get clamped by the driver.
+        """
+        if not self._isLine or not self.__dict__.get('interpolate'):
+            return
+        lineWidth = self.lineWidth
+        maxSmooth = _getMaxLineWidth(smooth=True)
+        if maxSmooth < lineWidth <= _getMaxLineWidth():
+            logging.warning(
+                "lineWidth is greater than max width supported by OpenGL for "
+                "smooth lines (%ipx), so may be drawn thinner. For wider "
+                "lines, please set interpolate=False or use a filled Rect "
+                "instead." % maxSmooth)
 
     def setLineWidth(self, value, operation='', log=None):
         setAttribute(self, 'lineWidth', value, log, operation)
@@ -233,12 +769,14 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
         assumed and shouldn't be changed.
         """
         self.__dict__['closeShape'] = value
+        self._drawFn = None
 
     @attributeSetter
     def interpolate(self, value):
         """If `True` the edge of the line will be anti-aliased.
         """
         self.__dict__['interpolate'] = value
+        self._checkLineWidth()
 
     @attributeSetter
     def color(self, color):
@@ -250,6 +788,53 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
         self.lineColor = color
         return ColorMixin.foreColor.fget(self)
 
+    @property
+    def fillColor(self):
+        """Set the fill color for the shape."""
+        return ColorMixin.fillColor.fget(self)
+
+    @fillColor.setter
+    def fillColor(self, value):
+        ColorMixin.fillColor.fset(self, value)
+        self._drawFn = None
+
+    @property
+    def borderColor(self):
+        """Set the border (line) color for the shape."""
+        return ColorMixin.borderColor.fget(self)
+
+    @borderColor.setter
+    def borderColor(self, value):
+        ColorMixin.borderColor.fset(self, value)
+        self._drawFn = None
+
+    def _getFillRGBA(self):
+        """Fill color as it should be passed to `glColor4f`.
+
+        `Color.render` caches its result until the color changes in any way
+        (including in place, e.g. `stim._fillColor.alpha = 0.5`), so the tuple
+        is only rebuilt when it returns a different array.
+        """
+        rendered = self._fillColor.render('rgba1')
+        if self._fillRGBA is None or self._fillRGBA[0] is not rendered:
+            self._fillRGBA = (rendered, tuple(rendered))
+        return self._fillRGBA[1]
+
+    def _getBorderRGBA(self):
+        """Border color as it should be passed to `glColor4f`, using the
+        stimulus `opacity` rather than the alpha of the border color if set.
+        """
+        rendered = self._borderColor.render('rgba1')
+        opacity = self.opacity
+        cached = self._borderRGBA
+        if cached is None or cached[0] is not rendered or \
+                cached[1] != opacity:
+            borderRGBA = list(rendered)
+            if opacity is not None:
+                borderRGBA[-1] = opacity  # override opacity
+            cached = self._borderRGBA = (rendered, opacity, tuple(borderRGBA))
+        return cached[2]
+
     #---legacy functions---
 
     def setColor(self, color, colorSpace=None, operation='', log=None):
@@ -270,7 +855,7 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
         # check if this is a name of one of our known shapes
         if isinstance(value, str) and value in knownShapes:
             value = knownShapes[value]
-            if value == "circle":
+            if isinstance(value, str) and value == "circle":
                 # If circle is requested, calculate how many points are needed for the gap between line rects to be < 1px
                 value = self._calculateMinEdges(self.lineWidth, threshold=5)
         if isinstance(value, int):
@@ -322,68 +907,236 @@ class BaseShapeStim(BaseVisualStim, DraggingMixin, ColorMixin, ContainerMixin):
         # Angles in a shape add up to 360, so theta is 360/2n, solve for n
         return int((360 / theta) / 2)
 
-    def draw(self, win=None, keepMatrix=False):
-        """Draw the stimulus in its relevant window.
+    def _updateVertices(self):
+        """Sets `verticesPix` and `_borderPix`, marking the vertex buffer as
+        needing to be re-uploaded on the next draw.
+        """
+        if self.units in ('degFlat', 'degFlatPos') or \
+                not hasattr(self, '_vertices'):
+            # vertices are corrected for screen curvature by layout
+            super(BaseShapeStim, self)._updateVertices()
+            self._needVertexUpload = True
+            self._drawFn = None
+            return
+
+        # the same transforms as layout.Vertices.pix followed by rotation
+        # about pos, but without the intermediate arrays
+        vertices = self._vertices
+        size = numpy.ravel(self._size.pix).astype(float)
+        scale = size * numpy.ravel(vertices._flip)
+        offset = numpy.asarray(vertices.anchorAdjust, dtype=float) * size
+        rotation = numpy.asarray(self._rotationMatrix, dtype=float)
+        pos = numpy.ravel(self._pos.pix).astype(float)
+
+        borderVerts = _transformVertices(
+            vertices.base, scale, offset, rotation, pos)
+        if hasattr(self, '_tesselVertices'):
+            verts = _transformVertices(
+                self._tesselVertices, scale, offset, rotation, pos)
+        else:
+            verts = borderVerts
 
-        You must call this method after every MyWin.flip() if you want the
-        stimulus to appear on that frame and then update the screen again.
+        self.__dict__['verticesPix'] = verts
+        self.__dict__['_borderPix'] = borderVerts
+        self._needVertexUpdate = False
+        self._needUpdate = True
+        self._needVertexUpload = True
+        self._drawFn = None  # number of vertices may have changed
+
+    def _checkThickBorder(self):
+        """Check whether the border is too wide to draw as a line.
         """
-        # The keepMatrix option is needed by Aperture
-        if win is None:
-            win = self.win
-        self._selectWindow(win)
+        self._thickBorder = self.lineWidth > _getMaxLineWidth()
+        return self._thickBorder
+
+    def _uploadVertexBuffers(self):
+        """Copy the current pixel vertices to the graphics card, followed by
+        the border as triangles if it's too wide to draw as a line.
+        """
+        verts = self.verticesPix
+        self._nVerts = verts.shape[0]
+        if self._checkThickBorder():
+            thickVerts = _borderTriangles(
+                verts, self.lineWidth, self.closeShape)
+            self._thickOffset = self._nVerts
+            self._nThickVerts = thickVerts.shape[0]
+            verts = numpy.concatenate((verts, thickVerts))
+        self._vbo = _updateVertexBuffer(self._vbo, verts)
+        self._needVertexUpload = False
+
+    def _getBatchVertices(self):
+        """Vertices (in pixels) to use when drawn as part of a
+        :class:`ShapeBatch`, as a tuple of `(fill, border)`. Fill vertices
+        are triangles.
+        """
+        verts = self.verticesPix
+        nVerts = verts.shape[0]
+        if nVerts < 3:
+            return verts[:0], verts
+        # the polygon is drawn as GL_POLYGON so is convex, split into a fan
+        return verts[_fanIndices(nVerts)], verts
+
+    def addToBatch(self, batch):
+        """Add this shape to a :class:`ShapeBatch`, so that it is drawn
+        along with the other shapes in the batch.
+
+        Parameters
+        ----------
+        batch : :class:`ShapeBatch`
+            Batch to add the shape to.
+
+        """
+        batch.add(self)
+
+    def __del__(self):
+        # remove vertex buffer from graphics card
+        try:
+            if self._vbo is not None:
+                _deleteVertexBuffer(self._vbo)
+        except Exception:
+            pass  # probably no GL context or never drawn
+
+    def _selectDrawFn(self):
+        """Choose which of the draw functions to use for the current fill,
+        border and line width, so `draw()` doesn't need to check them every
+        frame.
+
+        Returns the plain function rather than a bound method, so the stimulus
+        doesn't hold a reference to itself.
+        """
+        self._borderMode = _GL_LINE_LOOP if self.closeShape else _GL_LINE_STRIP
+        hasFill = self._hasFill()
+        hasBorder = _isVisible(self._borderColor) and self.lineWidth != 0.0
+        self._drawsFill, self._drawsBorder = hasFill, hasBorder
+        if hasFill and hasBorder:
+            return type(self)._drawFillAndBorder
+        elif hasFill:
+            return type(self)._drawFillOnly
+        elif hasBorder:
+            return type(self)._drawBorderOnly
+        return type(self)._drawNothing
+
+    def _hasFill(self):
+        """Is there a fill to draw?
+        """
+        return self.verticesPix.shape[0] > 2 and _isVisible(self._fillColor)
 
+    def _beginDraw(self, win, keepMatrix):
+        """Set up the GL state used to draw both the fill and the border.
+        """
         if win._haveShaders:
-            _prog = self.win._progSignedFrag
-            GL.glUseProgram(_prog)
-        # will check if it needs updating (check just once)
-        vertsPix = self.verticesPix
-        nVerts = vertsPix.shape[0]
+            _glUseProgram(win._progSignedFrag)
+        else:
+            _unbindTextures()
         # scale the drawing frame etc...
         if not keepMatrix:
-            GL.glPushMatrix()  # push before drawing, pop after
+            _glPushMatrix()  # push before drawing, pop after
             win.setScale('pix')
-        # load Null textures into multitexteureARB - or they modulate glColor
-        GL.glActiveTexture(GL.GL_TEXTURE0)
-        GL.glEnable(GL.GL_TEXTURE_2D)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
-        GL.glActiveTexture(GL.GL_TEXTURE1)
-        GL.glEnable(GL.GL_TEXTURE_2D)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
 
         if self.interpolate:
-            GL.glEnable(GL.GL_LINE_SMOOTH)
-            GL.glEnable(GL.GL_MULTISAMPLE)
+            _glEnable(_GL_LINE_SMOOTH)
+            _glEnable(_GL_MULTISAMPLE)
         else:
-            GL.glDisable(GL.GL_LINE_SMOOTH)
-            GL.glDisable(GL.GL_MULTISAMPLE)
-        # .data_as(ctypes.POINTER(ctypes.c_float)))
-        GL.glVertexPointer(2, GL.GL_DOUBLE, 0, vertsPix.ctypes)
-
-        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
-        if nVerts > 2:  # draw a filled polygon first
-            if self._fillColor != None:
-                # then draw
-                GL.glColor4f(*self._fillColor.render('rgba1'))
-                GL.glDrawArrays(GL.GL_POLYGON, 0, nVerts)
-        if self._borderColor != None and self.lineWidth != 0.0:
-            # then draw
-            GL.glLineWidth(self.lineWidth)
-            if self.opacity is not None:
-                borderRGBA = self._borderColor.render('rgba1')
-                borderRGBA[-1] = self.opacity  # override opacity
-                GL.glColor4f(*borderRGBA)
-            else:
-                GL.glColor4f(*self._borderColor.render('rgba1'))
-            if self.closeShape:
-                GL.glDrawArrays(GL.GL_LINE_LOOP, 0, nVerts)
-            else:
-                GL.glDrawArrays(GL.GL_LINE_STRIP, 0, nVerts)
-        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+            _glDisable(_GL_LINE_SMOOTH)
+            _glDisable(_GL_MULTISAMPLE)
+        gt.setVertexAttribPointer(
+            _GL_VERTEX_ARRAY, self._vbo,
+            offset=_vertexBufferOffset(self._vbo), legacy=True)
+
+    def _endDraw(self, win, keepMatrix):
+        """Restore the GL state changed by `_beginDraw()`.
+        """
+        gt.disableVertexAttribArray(_GL_VERTEX_ARRAY, legacy=True)
         if win._haveShaders:
-            GL.glUseProgram(0)
+            _glUseProgram(0)
         if not keepMatrix:
-            GL.glPopMatrix()
+            _glPopMatrix()
+
+    def _drawFill(self):
+        """Draw the filled polygon.
+        """
+        _glColor4f(*self._getFillRGBA())
+        _glDrawArrays(_GL_POLYGON, 0, self._nVerts)
+
+    def _drawBorder(self):
+        """Draw the border (outline) of the polygon.
+        """
+        _glColor4f(*self._getBorderRGBA())
+        if self._thickBorder:
+            _glDrawArrays(_GL_TRIANGLES, self._thickOffset, self._nThickVerts)
+            return
+        _glLineWidth(self.lineWidth)
+        _glDrawArrays(self._borderMode, 0, self._nVerts)
+
+    def _drawFillAndBorder(self, win, keepMatrix):
+        self._beginDraw(win, keepMatrix)
+        self._drawFill()  # draw a filled polygon first
+        self._drawBorder()
+        self._endDraw(win, keepMatrix)
+
+    def _drawFillOnly(self, win, keepMatrix):
+        self._beginDraw(win, keepMatrix)
+        self._drawFill()
+        self._endDraw(win, keepMatrix)
+
+    def _drawBorderOnly(self, win, keepMatrix):
+        self._beginDraw(win, keepMatrix)
+        self._drawBorder()
+        self._endDraw(win, keepMatrix)
+
+    def _drawNothing(self, win, keepMatrix):
+        pass  # both fill and border are invisible
+
+    def draw(self, win=None, keepMatrix=False):
+        """Draw the stimulus in its relevant window.
+
+        You must call this method after every MyWin.flip() if you want the
+        stimulus to appear on that frame and then update the screen again.
+        """
+        # The keepMatrix option is needed by Aperture
+        if win is None:
+            win = self.win
+        self._selectWindow(win)
+
+        self._prepareDraw()
+        self._drawFn(self, win, keepMatrix)
+
+    def _prepareDraw(self):
+        """Upload the vertices and choose the draw function, if needed.
+        """
+        # will check if the vertices need updating (check just once)
+        if self._needVertexUpdate or self._needVertexUpload:
+            self._uploadVertexBuffers()
+        if self._drawFn is None:
+            self._drawFn = self._selectDrawFn()
+
+    def _drawTogether(self, others, win, keepMatrix=False):
+        """Draw this shape followed by `others`, setting up the GL state they
+        share (shader program, matrix and smoothing) just once. Used by
+        compound stimuli such as `TargetStim`.
+
+        All the shapes should have the same `interpolate`, as smoothing is set
+        from this shape.
+        """
+        self._selectWindow(win)
+        self._prepareDraw()
+        for shape in others:
+            shape._prepareDraw()
+
+        self._beginDraw(win, keepMatrix)
+        if self._drawsFill:
+            self._drawFill()
+        if self._drawsBorder:
+            self._drawBorder()
+        for shape in others:
+            gt.setVertexAttribPointer(
+                _GL_VERTEX_ARRAY, shape._vbo,
+                offset=_vertexBufferOffset(shape._vbo), legacy=True)
+            if shape._drawsFill:
+                shape._drawFill()
+            if shape._drawsBorder:
+                shape._drawBorder()
+        self._endDraw(win, keepMatrix)
 
 
 class ShapeStim(BaseShapeStim):
@@ -562,6 +1315,12 @@ class ShapeStim(BaseShapeStim):
                                         autoLog=False,
                                         autoDraw=autoDraw)
 
+        # fill and border vertices share a buffer, border vertices start here
+        self._borderOffset = 0
+        # first vertex and number of vertices of each border loop, for shapes
+        # with holes (None if there's only one loop)
+        self._loopFirst = self._loopCount = None
+
         self.closeShape = closeShape
         self.windingRule = windingRule
         self.vertices = vertices
@@ -579,39 +1338,60 @@ class ShapeStim(BaseShapeStim):
         """Set the `.vertices` and `.border` to new values, invoking
         tessellation.
         """
-        # TO-DO: handle borders properly for multiloop stim like holes
-        # likely requires changes in ContainerMixin to iterate over each
-        # border loop
+        self.border = numpy.array(newVertices, dtype=float)
+        # borders of shapes with holes are drawn as one line per loop
+        if self.border.ndim == 3:
+            self._loopCount = numpy.array(
+                [len(loop) for loop in self.border], dtype=numpy.int32)
+            self._loopCountPtr = self._loopCount.ctypes.data_as(
+                ctypes.POINTER(GL.GLsizei))
+        else:
+            self._loopCount = None
+        if not self.closeShape:
+            # a line, so there's no fill to tesselate. Share the copy of the
+            # vertices made for the border
+            self.__dict__['_tesselVertices'] = numpy.asarray(
+                self.border, float)
+            return
+
         from psychopy.contrib import tesselate
 
-        self.border = copy.deepcopy(newVertices)
-        tessVertices = []  # define to keep the linter happy
-        if self.closeShape:
-            # convert original vertices to triangles (= tesselation) if
-            # possible. (not possible if closeShape is False, don't even try)
+        # convert original vertices to triangles (= tesselation) if possible
+        if newVertices.ndim == 3:
+            loops = newVertices
+        else:
+            loops = [newVertices]
+        tessVertices = []
+        if len(loops) == 1 and getattr(self, "windingRule", None) is None:
+            verts = numpy.asarray(loops[0], dtype=float)
+            if _isConvex(verts):
+                # convex polygons are just a fan of triangles
+                tessVertices = verts[_fanIndices(verts.shape[0])]
+            elif _getEarclip() is not None:
+                # simple polygons can be ear-clipped without GLU, returns
+                # nothing if the polygon isn't simple
+                tessVertices = _earclip(numpy.ascontiguousarray(verts))
+        if len(tessVertices) == 0:
             GL.glPushMatrix()  # seemed to help at one point, superfluous?
             if getattr(self, "windingRule", False):
                 GL.gluTessProperty(tesselate.tess, GL.GLU_TESS_WINDING_RULE,
                                    self.windingRule)
-            if hasattr(newVertices[0][0], '__iter__'):
-                loops = newVertices
-            else:
-                loops = [newVertices]
             tessVertices = tesselate.tesselate(loops)
             GL.glPopMatrix()
             if getattr(self, "windingRule", False):
                 GL.gluTessProperty(tesselate.tess, GL.GLU_TESS_WINDING_RULE,
                                    tesselate.default_winding_rule)
 
-        if not self.closeShape or tessVertices == []:
-            # probably got a line if tesselate returned []
-            initVertices = newVertices
+        if len(tessVertices) == 0:
+            # probably got a line if tesselate returned [], share the copy of
+            # the vertices made for the border
+            initVertices = self.border
             self.closeShape = False
         elif len(tessVertices) % 3:
             raise tesselate.TesselateError("Could not properly tesselate")
         else:
             initVertices = tessVertices
-        self.__dict__['_tesselVertices'] = numpy.array(initVertices, float)
+        self.__dict__['_tesselVertices'] = numpy.asarray(initVertices, float)
 
     @property
     def vertices(self):
@@ -626,81 +1406,341 @@ class ShapeStim(BaseShapeStim):
 
     @vertices.setter
     def vertices(self, value):
-        # check if this is a name of one of our known shapes
-        if isinstance(value, str) and value in knownShapes:
-            value = knownShapes[value]
-        if isinstance(value, str) and value == "circle":
-            # If circle is requested, calculate how many points are needed for the gap between line rects to be < 1px
-            value = self._calculateMinEdges(self.lineWidth, threshold=5)
-        if isinstance(value, int):
-            value = self._calcEquilateralVertices(value)
+        # arrays (e.g. vertices updated every frame) are used as they are
+        if not isinstance(value, numpy.ndarray):
+            # check if this is a name of one of our known shapes
+            if isinstance(value, str) and value in knownShapes:
+                value = knownShapes[value]
+            if isinstance(value, str) and value == "circle":
+                # If circle is requested, calculate how many points are needed for the gap between line rects to be < 1px
+                value = self._calculateMinEdges(self.lineWidth, threshold=5)
+            if isinstance(value, int):
+                value = self._calcEquilateralVertices(value)
         # Check shape
         WindowMixin.vertices.fset(self, value)
         self._needVertexUpdate = True
         self._tesselate(self.vertices)
 
-    def draw(self, win=None, keepMatrix=False):
-        """Draw the stimulus in the relevant window.
+    def _getBorderRGBA(self):
+        """Border color as it should be passed to `glColor4f`.
+        """
+        rendered = self._borderColor.render('rgba1')
+        if self._borderRGBA is None or self._borderRGBA[0] is not rendered:
+            self._borderRGBA = (rendered, tuple(rendered))
+        return self._borderRGBA[1]
+
+    def _getBatchVertices(self):
+        """Vertices (in pixels) to use when drawn as part of a
+        :class:`ShapeBatch`, as a tuple of `(fill, border)`. Fill vertices
+        are triangles.
+        """
+        verts = self.verticesPix
+        if not self.closeShape or verts.shape[0] < 3:
+            return verts[:0], self._borderPix
+        return verts, self._borderPix
+
+    def _uploadVertexBuffers(self):
+        """Copy the current pixel vertices (tesselated fill followed by the
+        border) to the graphics card.
+        """
+        fillVerts = self.verticesPix
+        borderVerts = self._borderPix
+        self._borderOffset = fillVerts.shape[0]
+        self._nBorderVerts = borderVerts.size // 2
+        buffers = [fillVerts, borderVerts.reshape(-1, 2)]
+        if self._checkThickBorder():
+            thickVerts = _borderTriangles(
+                borderVerts, self.lineWidth, self.closeShape)
+            self._thickOffset = self._borderOffset + self._nBorderVerts
+            self._nThickVerts = thickVerts.shape[0]
+            buffers.append(thickVerts)
+        self._vbo = _updateVertexBuffer(self._vbo, numpy.concatenate(buffers))
+        if self._loopCount is not None:
+            self._loopFirst = (
+                numpy.cumsum(self._loopCount) - self._loopCount +
+                self._borderOffset).astype(numpy.int32)
+            self._loopFirstPtr = self._loopFirst.ctypes.data_as(
+                ctypes.POINTER(GL.GLint))
+        self._needVertexUpload = False
+
+    def _hasFill(self):
+        """Are there interior triangles to fill?
+        """
+        return (self.closeShape and
+                self.verticesPix.shape[0] > 2 and
+                _isVisible(self._fillColor))
 
-        You must call this method after every `win.flip()` if you want the
-        stimulus to appear on that frame and then update the screen again.
+    def _drawFill(self):
+        """Draw the interior triangles, which come before the border
+        vertices in the buffer.
+        """
+        _glColor4f(*self._getFillRGBA())
+        _glDrawArrays(_GL_TRIANGLES, 0, self._borderOffset)
+
+    def _drawBorder(self):
+        """Draw the border (= a line connecting the non-tesselated vertices).
+        """
+        _glColor4f(*self._getBorderRGBA())
+        if self._thickBorder:
+            _glDrawArrays(_GL_TRIANGLES, self._thickOffset, self._nThickVerts)
+            return
+        _glLineWidth(self.lineWidth)
+        if self._loopCount is None:
+            _glDrawArrays(self._borderMode, self._borderOffset,
+                          self._nBorderVerts)
+        else:
+            # one line for each loop, all with a single call
+            _glMultiDrawArrays(self._borderMode, self._loopFirstPtr,
+                               self._loopCountPtr, len(self._loopCount))
+
+
+class ShapeBatch:
+    """Draw a group of shapes together.
+
+    Drawing shapes one at a time sets up the same OpenGL state and issues
+    separate draw calls for each of them, which adds up when dozens of shapes
+    are drawn every frame. A batch puts the vertices and colors of all its
+    shapes into shared buffers, so all fills are drawn with a single call
+    and borders with one call per line width.
+
+    Shapes keep their own attributes, so changing the `pos`, `ori`, colors
+    etc. of a shape in the batch is picked up the next time the batch is
+    drawn. All fills are drawn before any borders, so unlike drawing the
+    shapes individually the fill of one shape never covers the border of
+    another.
+
+    Parameters
+    ----------
+    win : :class:`~psychopy.visual.Window`
+        Window to draw the shapes to.
+    shapes : list of :class:`BaseShapeStim`
+        Shapes to add to the batch. More shapes can be added later with
+        :py:meth:`add` or :py:meth:`BaseShapeStim.addToBatch`.
+
+    Examples
+    --------
+    Draw a grid of squares::
+
+        batch = visual.ShapeBatch(win)
+        for x in range(-200, 201, 50):
+            for y in range(-200, 201, 50):
+                square = visual.Rect(win, size=40, pos=(x, y), units='pix')
+                square.addToBatch(batch)
+        batch.draw()
+
+    """
+    def __init__(self, win, shapes=()):
+        self.win = win
+        self._shapes = []
+        self._state = None  # shape attributes when the buffers were filled
+        self._vbo = None
+        self._colorVbo = None
+        self._nVerts = 0
+        self._nFillVerts = 0
+        self._fillInterpolate = True
+        # first vertex, vertex count and mode of each border
+        self._offsets = numpy.zeros((0,), dtype=numpy.int32)
+        self._counts = numpy.zeros((0,), dtype=numpy.int32)
+        self._modes = numpy.zeros((0,), dtype=numpy.int32)
+        # borders grouped by line width, as (lineWidth, mode, interpolate,
+        # offsets pointer, counts pointer, number of borders)
+        self._borderGroups = []
+        for shape in shapes:
+            self.add(shape)
+
+    def add(self, shape):
+        """Add a shape to the batch.
+
+        Parameters
+        ----------
+        shape : :class:`BaseShapeStim`
+            Shape to add.
+
+        """
+        self._shapes.append(shape)
+        self._state = None
+
+    def remove(self, shape):
+        """Remove a shape from the batch.
+
+        Parameters
+        ----------
+        shape : :class:`BaseShapeStim`
+            Shape to remove.
+
+        """
+        self._shapes.remove(shape)
+        self._state = None
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def __iter__(self):
+        return iter(self._shapes)
+
+    def _getState(self):
+        """Get the attributes of each shape which affect what goes in the
+        buffers.
         """
-        # mostly copied from BaseShapeStim. Uses GL_TRIANGLES and depends on
-        # two arrays of vertices: tesselated (for fill) & original (for
-        # border) keepMatrix is needed by Aperture, although Aperture
-        # currently relies on BaseShapeStim instead
+        state = []
+        for shape in self._shapes:
+            state.append((
+                shape.verticesPix,  # updates the vertices if needed
+                shape._getFillRGBA() if _isVisible(shape._fillColor)
+                else None,
+                shape._getBorderRGBA() if _isVisible(shape._borderColor)
+                else None,
+                float(shape.lineWidth),
+                bool(shape.closeShape),
+                bool(shape.interpolate)))
+        return state
+
+    def _isStale(self, state):
+        """Check whether the buffers need refilling for the given state.
+        """
+        if self._state is None or len(state) != len(self._state):
+            return True
+        for new, old in zip(state, self._state):
+            # vertices are replaced rather than modified when they change, so
+            # compare them by identity and everything else by value
+            if new[0] is not old[0] or new[1:] != old[1:]:
+                return True
+        return False
+
+    def _fillBuffers(self, state):
+        """Concatenate the vertices and colors of all shapes and upload them
+        to the graphics card.
+        """
+        fillVerts, fillColors = [], []
+        thickVerts, thickColors = [], []
+        borderVerts, borderColors = [], []
+        offsets, counts, modes, keys = [], [], [], []
+        nBorderVerts = 0
+        fillInterpolate = False
+        for shape, shapeState in zip(self._shapes, state):
+            _, fillRGBA, borderRGBA, lineWidth, closeShape, interpolate = \
+                shapeState
+            fill, border = shape._getBatchVertices()
+            if fillRGBA is not None and fill.shape[0] > 2:
+                fillVerts.append(fill)
+                fillColors.append(numpy.tile(fillRGBA, (fill.shape[0], 1)))
+                fillInterpolate = fillInterpolate or interpolate
+            if borderRGBA is not None and \
+                    lineWidth > _getMaxLineWidth():
+                # too wide to draw as lines, draw with the fills
+                triangles = _borderTriangles(border, lineWidth, closeShape)
+                thickVerts.append(triangles)
+                thickColors.append(
+                    numpy.tile(borderRGBA, (triangles.shape[0], 1)))
+            elif borderRGBA is not None and lineWidth:
+                mode = GL.GL_LINE_LOOP if closeShape else GL.GL_LINE_STRIP
+                # shapes with holes have a border for each loop
+                loops = border if border.ndim == 3 else (border,)
+                for loop in loops:
+                    borderVerts.append(loop)
+                    borderColors.append(
+                        numpy.tile(borderRGBA, (loop.shape[0], 1)))
+                    offsets.append(nBorderVerts)
+                    counts.append(loop.shape[0])
+                    modes.append(mode)
+                    keys.append((lineWidth, mode, interpolate))
+                    nBorderVerts += loop.shape[0]
+
+        # thick borders come after all fills, so they're drawn over them
+        fillVerts += thickVerts
+        fillColors += thickColors
+        self._nFillVerts = sum(verts.shape[0] for verts in fillVerts)
+        self._nVerts = self._nFillVerts + nBorderVerts
+        self._fillInterpolate = fillInterpolate
+        # borders come after the fills in the buffers
+        self._offsets = numpy.asarray(offsets, dtype=numpy.int32) + \
+            self._nFillVerts
+        self._counts = numpy.asarray(counts, dtype=numpy.int32)
+        self._modes = numpy.asarray(modes, dtype=numpy.int32)
+
+        # group borders which can be drawn with a single call
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+        # pointers are made here rather than on every draw, they keep a
+        # reference to their array
+        self._borderGroups = []
+        for key, idx in groups.items():
+            offsets = numpy.ascontiguousarray(self._offsets[idx])
+            counts = numpy.ascontiguousarray(self._counts[idx])
+            self._borderGroups.append(key + (
+                offsets.ctypes.data_as(ctypes.POINTER(GL.GLint)),
+                counts.ctypes.data_as(ctypes.POINTER(GL.GLsizei)),
+                len(idx)))
+
+        if self._nVerts:
+            self._vbo = _updateVertexBuffer(
+                self._vbo, numpy.concatenate(fillVerts + borderVerts))
+            self._colorVbo = _updateVertexBuffer(
+                self._colorVbo, numpy.concatenate(fillColors + borderColors),
+                size=4)
+        self._state = state
+
+    def draw(self, win=None):
+        """Draw all shapes in the batch.
 
+        You must call this method after every `win.flip()` if you want the
+        shapes to appear on that frame and then update the screen again.
+        """
         if win is None:
             win = self.win
-        self._selectWindow(win)
+        win._setCurrent()
 
-        # scale the drawing frame etc...
-        if not keepMatrix:
-            GL.glPushMatrix()
-            win.setScale('pix')
+        state = self._getState()
+        if self._isStale(state):
+            self._fillBuffers(state)
+        if not self._nVerts:
+            return
 
-        # setup the shaderprogram
+        _glPushMatrix()
+        win.setScale('pix')
         if win._haveShaders:
-            _prog = self.win._progSignedFrag
-            GL.glUseProgram(_prog)
+            _glUseProgram(win._progSignedFrag)
 
-        # load Null textures into multitexteureARB - or they modulate glColor
-        GL.glActiveTexture(GL.GL_TEXTURE0)
-        GL.glEnable(GL.GL_TEXTURE_2D)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
-        GL.glActiveTexture(GL.GL_TEXTURE1)
-        GL.glEnable(GL.GL_TEXTURE_2D)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        if not win._haveShaders:
+            _unbindTextures()
 
-        if self.interpolate:
-            GL.glEnable(GL.GL_LINE_SMOOTH)
-            GL.glEnable(GL.GL_MULTISAMPLE)
-        else:
-            GL.glDisable(GL.GL_LINE_SMOOTH)
-            GL.glDisable(GL.GL_MULTISAMPLE)
-        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        gt.setVertexAttribPointer(
+            _GL_VERTEX_ARRAY, self._vbo,
+            offset=_vertexBufferOffset(self._vbo), legacy=True)
+        gt.setVertexAttribPointer(
+            _GL_COLOR_ARRAY, self._colorVbo,
+            offset=_vertexBufferOffset(self._colorVbo), legacy=True)
 
-        # fill interior triangles if there are any
-        if (self.closeShape and
-                self.verticesPix.shape[0] > 2 and
-                self._fillColor != None):
-            GL.glVertexPointer(2, GL.GL_DOUBLE, 0, self.verticesPix.ctypes)
-            GL.glColor4f(*self._fillColor.render('rgba1'))
-            GL.glDrawArrays(GL.GL_TRIANGLES, 0, self.verticesPix.shape[0])
-
-        # draw the border (= a line connecting the non-tesselated vertices)
-        if self._borderColor != None and self.lineWidth:
-            GL.glVertexPointer(2, GL.GL_DOUBLE, 0, self._borderPix.ctypes)
-            GL.glLineWidth(self.lineWidth)
-            GL.glColor4f(*self._borderColor.render('rgba1'))
-            if self.closeShape:
-                gl_line = GL.GL_LINE_LOOP
+        if self._nFillVerts:
+            if self._fillInterpolate:
+                _glEnable(_GL_MULTISAMPLE)
+            else:
+                _glDisable(_GL_MULTISAMPLE)
+            _glDrawArrays(_GL_TRIANGLES, 0, self._nFillVerts)
+
+        for lineWidth, mode, interpolate, offsets, counts, nBorders in \
+                self._borderGroups:
+            if interpolate:
+                _glEnable(_GL_LINE_SMOOTH)
+                _glEnable(_GL_MULTISAMPLE)
             else:
-                gl_line = GL.GL_LINE_STRIP
-            GL.glDrawArrays(gl_line, 0, self._borderPix.shape[0])
+                _glDisable(_GL_LINE_SMOOTH)
+                _glDisable(_GL_MULTISAMPLE)
+            _glLineWidth(lineWidth)
+            _glMultiDrawArrays(mode, offsets, counts, nBorders)
 
-        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        gt.disableVertexAttribArray(_GL_COLOR_ARRAY, legacy=True)
+        gt.disableVertexAttribArray(_GL_VERTEX_ARRAY, legacy=True)
         if win._haveShaders:
-            GL.glUseProgram(0)
-        if not keepMatrix:
-            GL.glPopMatrix()
+            _glUseProgram(0)
+        _glPopMatrix()
+
+    def __del__(self):
+        # remove vertex buffers from graphics card
+        try:
+            for vbo in (self._vbo, self._colorVbo):
+                if vbo is not None:
+                    _deleteVertexBuffer(vbo)
+        except Exception:
+            pass  # probably no GL context or never drawn
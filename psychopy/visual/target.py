@@ -1,3 +1,5 @@
+import numpy
+
 from .shape import ShapeStim
 from .basevisual import ColorMixin, WindowMixin, MinimalStim
 from psychopy.colors import Color
@@ -5,11 +7,23 @@ from .. import layout
 
 knownStyles = ["circles", "cross", ]
 
+# Keys of a target in ioHub format, in the order they're given by dict(target)
+_TARGET_KEYS = (
+    'outer_diameter', 'outer_stroke_width', 'outer_fill_color', 'outer_line_color',
+    'inner_diameter', 'inner_stroke_width', 'inner_fill_color', 'inner_line_color',
+)
+
 
 class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     """
     A target for use in eyetracker calibration, if converted to a dict will return in the correct format for ioHub
     """
+    # Attributes set by TargetStim itself get slots, the base classes still give it a __dict__ for the rest
+    __slots__ = (
+        'outer', '_inner', '_innerArgs',
+        '_style', '_sizeBuffer', '_pixSizeBuffer', '_anchorBuffer', '_foreTargets',
+    )
+
     def __init__(self,
                  win, name=None, style="circles",
                  radius=.05, fillColor=(1, 1, 1, 0.1), borderColor="white", lineWidth=2,
@@ -17,44 +31,87 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
                  pos=(0, 0), units=None, anchor="center",
                  colorSpace="rgb",
                  autoLog=None, autoDraw=False):
+        # Shapes and style are set below, start as None so getters don't need to check for them
+        self.outer = self._inner = None
+        self._innerArgs = None
+        self._style = None
         self.win = win
+        # Buffer objects to handle unit conversion of radii, reused rather than made on each set
+        self._sizeBuffer = layout.Size((0, 0), units='pix', win=win)
+        self._pixSizeBuffer = layout.Size((0, 0), units='pix', win=win)
+        # Array to work out the inner shape's pos in when anchor is set
+        self._anchorBuffer = numpy.zeros(2)
         # Make sure name is a string
         if name is None:
             name = "target"
-        # Create shapes
+        # Create shapes, at their final size so radii don't need setting again
         self.outer = ShapeStim(win, name=name,
                                vertices="circle",
-                               size=(radius*2, radius*2), pos=pos,
+                               size=self._radiusToSize(radius, units), pos=pos,
                                lineWidth=lineWidth, units=units,
                                fillColor=fillColor, lineColor=borderColor, colorSpace=colorSpace,
                                autoLog=autoLog, autoDraw=autoDraw)
-        self.outerRadius = radius
-        self.inner = ShapeStim(win, name=name+"Inner",
-                               vertices="circle",
-                               size=(innerRadius*2, innerRadius*2), pos=pos, units=units,
-                               lineWidth=(innerLineWidth or lineWidth),
-                               fillColor=innerFillColor, lineColor=innerBorderColor, colorSpace=colorSpace,
-                               autoLog=autoLog, autoDraw=autoDraw)
-        self.innerRadius = innerRadius
+        innerArgs = dict(name=name+"Inner",
+                         size=self._radiusToSize(innerRadius, units).copy(),
+                         lineWidth=(innerLineWidth or lineWidth),
+                         fillColor=innerFillColor, lineColor=innerBorderColor,
+                         autoLog=autoLog, autoDraw=autoDraw)
+        if not autoDraw and (innerRadius == 0 or (innerFillColor is None and innerBorderColor is None)):
+            # Inner shape can't be seen, so only make it if it's accessed
+            self._innerArgs = innerArgs
+        else:
+            self._makeInner(innerArgs, pos=pos)
+        # Inner colors which act as this stim's foreColor, worked out once rather than on each access
+        self._foreTargets = tuple(
+            attrib for attrib, color in (("fillColor", innerFillColor), ("borderColor", innerBorderColor))
+            if color is not None
+        )
 
         self.style = style
         self.anchor = anchor
 
+    def _makeInner(self, innerArgs, pos=None):
+        """Make the inner shape, matching the outer shape's current units, window, colorSpace and
+        opacity, and this stim's style and anchor"""
+        if pos is None:
+            pos = self._getAnchoredPos()
+        self._inner = ShapeStim(self.win, vertices="cross" if self._style == "cross" else "circle",
+                                pos=pos, units=self.units, colorSpace=self.colorSpace,
+                                opacity=self.outer.opacity, **innerArgs)
+        self._innerArgs = None
+
+    @property
+    def inner(self):
+        """Inner shape, made on first access if it wasn't needed for drawing"""
+        if self._inner is None and self._innerArgs is not None:
+            self._makeInner(self._innerArgs)
+        return self._inner
+
+    @inner.setter
+    def inner(self, value):
+        self._inner = value
+        self._innerArgs = None
+
     @property
     def style(self):
-        if hasattr(self, "_style"):
-            return self._style
+        return self._style
 
     @style.setter
     def style(self, value):
-        self._style = value
-        if value == "circles":
+        if value == self._style:
+            return
+        # Both shapes are made as circles and the outer one stays a circle, so only the inner one
+        # needs new vertices, and only if it's been changed from a circle
+        # (an inner shape not made yet gets the right vertices when it is)
+        if self._inner is None:
+            pass
+        elif value == "circles" and self._style is not None:
             # Two circles
-            self.outer.vertices = self.inner.vertices = "circle"
+            self._inner.vertices = "circle"
         elif value == "cross":
             # Circle with a cross inside
-            self.outer.vertices = "circle"
-            self.inner.vertices = "cross"
+            self._inner.vertices = "cross"
+        self._style = value
 
     @property
     def anchor(self):
@@ -63,7 +120,16 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @anchor.setter
     def anchor(self, value):
         self.outer.anchor = value
-        self.inner.pos = self.pos + self.size * self.outer._vertices.anchorAdjust
+        if self._inner is not None:
+            self._inner.pos = self._getAnchoredPos()
+
+    def _getAnchoredPos(self):
+        """Get the outer shape's anchor point, for the inner shape's pos"""
+        # Work in place in our buffer (the inner shape's pos setter copies it)
+        offset = self._anchorBuffer
+        numpy.multiply(self.size, self.outer._vertices.anchorAdjust, out=offset)
+        numpy.add(self.pos, offset, out=offset)
+        return offset
 
     @property
     def pos(self):
@@ -73,10 +139,11 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @pos.setter
     def pos(self, value):
         # Do base pos setting
-        WindowMixin.size.fset(self, value)
+        WindowMixin.pos.fset(self, value)
 
         self.outer.pos = value
-        self.inner.pos = value
+        if self._inner is not None:
+            self._inner.pos = value
 
     def setPos(self, value):
         self.pos = value
@@ -89,8 +156,8 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     def size(self, value):
         # Do base size setting
         WindowMixin.size.fset(self, value)
-        # Set new sizes
-        self.outer.size = value
+        # Set new sizes from the size object just made, so the value is only converted to pix once
+        self.outer.size = self._size
 
     @property
     def minSize(self):
@@ -98,15 +165,15 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
 
     @property
     def units(self):
-        if hasattr(self, "outer"):
+        if self.outer is not None:
             return self.outer.units
 
     @units.setter
     def units(self, value):
-        if hasattr(self, "outer"):
+        if self.outer is not None:
             self.outer.units = value
-        if hasattr(self, "inner"):
-            self.inner.units = value
+        if self._inner is not None:
+            self._inner.units = value
 
     @property
     def win(self):
@@ -115,9 +182,9 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @win.setter
     def win(self, value):
         WindowMixin.win.fset(self, value)
-        if hasattr(self, "inner"):
-            self.inner.win = value
-        if hasattr(self, "outer"):
+        if self._inner is not None:
+            self._inner.win = value
+        if self.outer is not None:
             self.outer.win = value
 
     @property
@@ -139,7 +206,7 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @radius.setter
     def radius(self, value):
         # Set outer radius
-        self.outerRadius = value
+        self._setShapeRadius(self.outer, value)
 
     @property
     def outerRadius(self):
@@ -151,10 +218,7 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
 
     @outerRadius.setter
     def outerRadius(self, value):
-        # Make buffer object to handle unit conversion
-        _buffer = layout.Size((0, value * 2), units=self.units, win=self.win)
-        # Use height of buffer object twice, so that size is always square even in norm
-        self.outer.size = layout.Size((_buffer.pix[1], _buffer.pix[1]), units='pix', win=self.win)
+        self._setShapeRadius(self.outer, value)
 
     @property
     def innerRadius(self):
@@ -166,27 +230,45 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
 
     @innerRadius.setter
     def innerRadius(self, value):
-        # Make buffer object to handle unit conversion
-        _buffer = layout.Size((0, value * 2), units=self.units, win=self.win)
-        # Use height of buffer object twice, so that size is always square even in norm
-        self.inner.size = layout.Size((_buffer.pix[1], _buffer.pix[1]), units='pix', win=self.win)
+        self._setShapeRadius(self.inner, value)
+
+    def _radiusToSize(self, value, units):
+        """Get the size (in pix) of a circle with the given radius in the given units"""
+        win = self.win
+        if units in (None, ''):
+            units = win.units
+        # Units which scale with window height can be converted directly, as in layout.Vector
+        if units == 'pix':
+            diameter = value * 2
+        elif units == 'height':
+            diameter = value * 2 * (win.size[1] / (win.useRetina + 1))
+        elif units == 'norm':
+            diameter = value * 2 * (win.size[1] / (win.useRetina + 1)) / 2
+        else:
+            # Use buffer object to handle unit conversion for units which need the monitor
+            self._sizeBuffer.set((0, value * 2), units=units, win=win)
+            diameter = self._sizeBuffer.pix[1]
+        # Use height of buffer object twice, so that size is always square even in norm (shapes copy
+        # the values when their size is set, so the same buffer can be given each time)
+        self._pixSizeBuffer.set((diameter, diameter), units='pix', win=self.win)
+        return self._pixSizeBuffer
+
+    def _setShapeRadius(self, shape, value):
+        """Set the size of one of the shapes from a radius in this stim's units"""
+        shape.size = self._radiusToSize(value, self.units)
 
     @property
     def foreColor(self):
-        # Return whichever inner color is not None
-        if self.inner.fillColor is not None:
-            return self.inner.fillColor
-        if self.inner.borderColor is not None:
-            return self.inner.borderColor
+        # Return whichever inner color was not None (fill first)
+        if self._foreTargets:
+            return getattr(self.inner, self._foreTargets[0])
 
     @foreColor.setter
     def foreColor(self, value):
         ColorMixin.foreColor.fset(self, value)
-        # Set whichever inner color is not None
-        if self.inner.fillColor is not None:
-            self.inner.fillColor = value
-        if self.inner.borderColor is not None:
-            self.inner.borderColor = value
+        # Set whichever inner colors were not None
+        for attrib in self._foreTargets:
+            setattr(self.inner, attrib, value)
 
     @property
     def borderColor(self):
@@ -213,7 +295,8 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @colorSpace.setter
     def colorSpace(self, value):
         self.outer.colorSpace = value
-        self.inner.colorSpace = value
+        if self._inner is not None:
+            self._inner.colorSpace = value
 
     @property
     def opacity(self):
@@ -222,11 +305,23 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
     @opacity.setter
     def opacity(self, value):
         self.outer.opacity = value
-        self.inner.opacity = value
+        if self._inner is not None:
+            self._inner.opacity = value
 
     def draw(self, win=None, keepMatrix=False):
-        self.outer.draw(win, keepMatrix)
-        self.inner.draw(win, keepMatrix)
+        # Get window once for both shapes
+        if win is None:
+            win = self.win
+        outer, inner = self.outer, self._inner
+        if isinstance(inner, ShapeStim) and isinstance(outer, ShapeStim) \
+                and inner.interpolate == outer.interpolate:
+            # Draw both shapes in one go, setting up shared GL state once
+            outer._drawTogether((inner,), win, keepMatrix)
+        else:
+            outer.draw(win, keepMatrix)
+            # Inner shape isn't drawn if it hasn't been made, as it can't be seen
+            if inner is not None:
+                inner.draw(win, keepMatrix)
 
     def __iter__(self):
         """Overload dict() method to return in ioHub format"""
@@ -237,21 +332,13 @@ class TargetStim(MinimalStim, ColorMixin, WindowMixin):
         # For inner circle, use outer circle fill as transparent
         innerFillColor = self.inner.fillColor if self.inner._fillColor else fillColor
         innerBorderColor = self.inner.borderColor if self.inner._borderColor else borderColor
-        # Assemble dict
-        asDict = {
+        # Pair values with keys, in the same order as _TARGET_KEYS
+        yield from zip(_TARGET_KEYS, (
             # Outer circle
-            'outer_diameter': self.radius * 2,
-            'outer_stroke_width': self.outer.lineWidth,
-            'outer_fill_color': fillColor,
-            'outer_line_color': borderColor,
+            self.outer.size[1], self.outer.lineWidth, fillColor, borderColor,
             # Inner circle
-            'inner_diameter': self.innerRadius * 2,
-            'inner_stroke_width': self.inner.lineWidth,
-            'inner_fill_color': innerFillColor,
-            'inner_line_color': innerBorderColor,
-        }
-        for key, value in asDict.items():
-            yield key, value
+            self.inner.size[1], self.inner.lineWidth, innerFillColor, innerBorderColor,
+        ))
 
 
 def targetFromDict(win, spec,
@@ -260,19 +347,14 @@ def targetFromDict(win, spec,
                    colorSpace="rgb",
                    autoLog=None, autoDraw=False):
     # Make sure spec has all the required keys, even if it just fills them with None
-    required = [
-        'outer_diameter', 'outer_stroke_width', 'outer_fill_color', 'outer_line_color',
-        'inner_diameter', 'inner_stroke_width', 'inner_fill_color', 'inner_line_color'
-    ]
-    for key in required:
-        if key not in spec:
-            spec[key] = None
+    for key in _TARGET_KEYS:
+        spec.setdefault(key, None)
     # Make a target stim from spec
-    TargetStim(win, name=name, style=style,
-               radius=spec['outer_diameter']/2, lineWidth=spec['outer_stroke_width'],
-               fillColor=spec['outer_fill_color'], borderColor=spec['outer_line_color'],
-               innerRadius=spec['inner_diameter']/2, innerLineWidth=spec['inner_stroke_width'],
-               innerFillColor=spec['inner_fill_color'], innerBorderColor=spec['inner_line_color'],
-               pos=pos, units=units,
-               colorSpace=colorSpace,
-               autoLog=autoLog, autoDraw=autoDraw)
\ No newline at end of file
+    return TargetStim(win, name=name, style=style,
+                      radius=spec['outer_diameter']/2, lineWidth=spec['outer_stroke_width'],
+                      fillColor=spec['outer_fill_color'], borderColor=spec['outer_line_color'],
+                      innerRadius=spec['inner_diameter']/2, innerLineWidth=spec['inner_stroke_width'],
+                      innerFillColor=spec['inner_fill_color'], innerBorderColor=spec['inner_line_color'],
+                      pos=pos, units=units,
+                      colorSpace=colorSpace,
+                      autoLog=autoLog, autoDraw=autoDraw)